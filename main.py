@@ -1,18 +1,24 @@
-from datetime import date, datetime
+import hashlib
+import math
+from datetime import date
+from secrets import token_hex
+from time import monotonic
 from urllib.parse import quote, urlparse
 
-from fastapi import FastAPI, Request, Depends, Form, HTTPException, status
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import FastAPI, Request, Depends, Form, HTTPException, Response, status
+from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
 from starlette.middleware.sessions import SessionMiddleware
-from sqlalchemy import func, inspect, text, or_
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, case, func, insert, inspect, select, text, or_
+from sqlalchemy.orm import Session, selectinload
 
 from settings import settings
 from database import SessionLocal, engine
-from models import Account, JournalEntry, JournalLine, User, Base, Customer, Supplier, Item, Lead, LeadNote, LeadTask, CRMUser
+from models import Account, AccountBalanceDaily, JournalEntry, JournalLine, PartyType, User, Base, Customer, Supplier, Item, Lead, LeadNote, LeadTask, CRMUser
 from seed import init_db
+from utils import trial_balance_rows
 from utils_auth import hash_password, verify_password
 
 # ---------------------- App & Middleware ----------------------
@@ -26,7 +32,18 @@ app.add_middleware(
 )
 
 app.mount("/static", StaticFiles(directory="static"), name="static")
-templates = Jinja2Templates(directory="templates")
+
+# Explicit environment: bytecode caching skips recompiling templates across
+# processes, and auto_reload (a stat() per include) stays on only in debug.
+templates = Jinja2Templates(
+    env=Environment(
+        loader=FileSystemLoader("templates"),
+        autoescape=True,
+        auto_reload=settings.DEBUG,
+        bytecode_cache=FileSystemBytecodeCache(),
+        cache_size=400,
+    )
+)
 
 # ---------------------- DB Session ----------------------
 def get_db():
@@ -39,6 +56,102 @@ def get_db():
 # ---------------------- Helpers ----------------------
 LOGIN_PATH = "/login"
 
+CASH_ACCOUNT_NAMES = ["Cash on Hand", "Bank - Current Account"]
+
+# In-process cache for report aggregates. Keys include the journal version, so
+# any journal mutation bumps the version and stale entries are never served.
+_journal_version = 0
+_agg_cache: dict = {}
+AGG_CACHE_MAX = 256
+AGG_CACHE_TTL = 60.0
+
+
+# Distinguishes ETags across restarts, since _journal_version starts at 0.
+_boot_token = token_hex(4)
+
+
+def bump_journal_version():
+    global _journal_version
+    _journal_version += 1
+    _agg_cache.clear()
+
+
+def report_etag(*parts) -> str:
+    """Weak ETag for a report: changes whenever the journal (or the requested
+    parameters) change, so unchanged reports revalidate as 304s."""
+    return f'W/"{_boot_token}-{_journal_version}-' + "-".join(str(p) for p in parts) + '"'
+
+
+def _dialect_insert():
+    if engine.dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert
+
+
+def apply_balance_deltas(db: Session, entry_date: date, line_amounts, sign: int = 1):
+    """Fold one entry's (account_id, debit, credit) amounts into the per-day
+    balance snapshots. sign=-1 reverses an entry being deleted."""
+    deltas = {}
+    for account_id, debit, credit in line_amounts:
+        d, c = deltas.get(account_id, (0.0, 0.0))
+        deltas[account_id] = (d + sign * float(debit or 0), c + sign * float(credit or 0))
+
+    dialect_insert = _dialect_insert()
+    for account_id, (d, c) in deltas.items():
+        stmt = dialect_insert(AccountBalanceDaily).values(
+            account_id=account_id, date=entry_date, debit_sum=d, credit_sum=c
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["account_id", "date"],
+            set_={
+                "debit_sum": AccountBalanceDaily.debit_sum + d,
+                "credit_sum": AccountBalanceDaily.credit_sum + c,
+            },
+        )
+        db.execute(stmt)
+
+
+def ensure_balance_snapshots():
+    # Backfill the rollup from the raw journal once for databases that
+    # predate the snapshot table.
+    with SessionLocal() as db:
+        if db.execute(select(AccountBalanceDaily.id).limit(1)).first() is not None:
+            return
+        rows = db.execute(
+            select(
+                JournalLine.account_id,
+                JournalEntry.date,
+                func.coalesce(func.sum(JournalLine.debit), 0),
+                func.coalesce(func.sum(JournalLine.credit), 0),
+            )
+            .join(JournalEntry)
+            .group_by(JournalLine.account_id, JournalEntry.date)
+        ).all()
+        if rows:
+            db.execute(
+                insert(AccountBalanceDaily),
+                [
+                    {"account_id": account_id, "date": day, "debit_sum": dr, "credit_sum": cr}
+                    for account_id, day, dr, cr in rows
+                ],
+            )
+            db.commit()
+
+
+def cached_aggregate(key: tuple, compute):
+    key = (_journal_version,) + key
+    hit = _agg_cache.get(key)
+    now = monotonic()
+    if hit is not None and now - hit[1] < AGG_CACHE_TTL:
+        return hit[0]
+    value = compute()
+    if len(_agg_cache) >= AGG_CACHE_MAX:
+        _agg_cache.clear()
+    _agg_cache[key] = (value, now)
+    return value
+
 
 LEAD_STATUSES = [
     "NEW",
@@ -57,12 +170,12 @@ def _generate_lead_no(db: Session, dt: date | None = None) -> str:
     dt = dt or date.today()
     year = dt.year
     prefix = f"LD-{year}-"
-    latest = (
-        db.query(Lead)
-        .filter(Lead.lead_no.like(f"{prefix}%"))
+    latest = db.execute(
+        select(Lead)
+        .where(Lead.lead_no.like(f"{prefix}%"))
         .order_by(Lead.id.desc())
-        .first()
-    )
+        .limit(1)
+    ).scalars().first()
     if latest and latest.lead_no:
         try:
             seq = int(latest.lead_no.split("-")[-1]) + 1
@@ -80,34 +193,151 @@ def _is_safe_next(next_url: str) -> bool:
     except Exception:
         return False
 
+class AuthRedirect(Exception):
+    """Unauthenticated access to a protected page; handled as a plain 303
+    redirect without going through FastAPI's HTTPException formatting."""
+
+    def __init__(self, next_path: str):
+        self.next_path = next_path
+
+
+@app.exception_handler(AuthRedirect)
+async def auth_redirect_handler(request: Request, exc: AuthRedirect):
+    return RedirectResponse(f"{LOGIN_PATH}?next={quote(exc.next_path)}", status_code=303)
+
+
+# Short-lived cache for the logged-in user record, saving a SELECT on every
+# protected page. Entries are dropped on logout.
+_user_cache: dict = {}
+USER_CACHE_TTL = 60.0
+
+
+def invalidate_user_cache(uid):
+    _user_cache.pop(uid, None)
+
+
 def require_user(request: Request, db: Session = Depends(get_db)) -> User:
     uid = request.session.get("uid")
     if uid:
+        hit = _user_cache.get(uid)
+        if hit is not None and monotonic() - hit[1] < USER_CACHE_TTL:
+            return hit[0]
         user = db.get(User, uid)
         if user:
+            _user_cache[uid] = (user, monotonic())
             return user
         request.session.clear()
-    raise HTTPException(
-        status_code=303,
-        headers={"Location": f"{LOGIN_PATH}?next={quote(request.url.path)}"}
-    )
+    raise AuthRedirect(request.url.path)
 
 # ---------------------- Startup ----------------------
+# Fingerprint of the declared schema; create_all (and its per-table
+# introspection queries) only runs when this no longer matches the database.
+SCHEMA_HASH = hashlib.blake2b(
+    repr(sorted((t.name, [c.name for c in t.columns]) for t in Base.metadata.tables.values())).encode()
+).hexdigest()
+
+
+def ensure_schema():
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS schema_meta (k VARCHAR PRIMARY KEY, v VARCHAR)"))
+        row = conn.execute(text("SELECT v FROM schema_meta WHERE k = 'schema_hash'")).first()
+    if row and row[0] == SCHEMA_HASH:
+        return False
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM schema_meta WHERE k = 'schema_hash'"))
+        conn.execute(text("INSERT INTO schema_meta (k, v) VALUES ('schema_hash', :v)"), {"v": SCHEMA_HASH})
+    return True
+
+
+def refresh_cash_account_ids():
+    # The cash accounts are fixed seed rows; resolving their ids once saves a
+    # name lookup on every dashboard hit.
+    with SessionLocal() as db:
+        app.state.cash_account_ids = db.execute(
+            select(Account.id).where(Account.name.in_(CASH_ACCOUNT_NAMES))
+        ).scalars().all()
+
+
 @app.on_event("startup")
 def startup():
-    inspector = inspect(engine)
-    if not inspector.has_table("users"):
-        Base.metadata.create_all(bind=engine)
-    else:
-        Base.metadata.create_all(bind=engine)
+    if ensure_schema():
+        ensure_item_sku_column()
+        ensure_journal_line_amount_column()
+        ensure_journal_indexes()
+        ensure_created_at_defaults()
+    ensure_recent_entries_index()
+    init_db(create_schema=False)
+    ensure_balance_snapshots()
+    refresh_cash_account_ids()
+
+    # One INSERT ... ON CONFLICT DO NOTHING instead of a read-then-write pair.
+    stmt = (
+        _dialect_insert()(User)
+        .values(username="admin", password_hash=hash_password("change-me"))
+        .on_conflict_do_nothing(index_elements=["username"])
+    )
+    with SessionLocal() as db:
+        db.execute(stmt)
+        db.commit()
 
-    ensure_item_sku_column()
-    init_db()
 
-    with SessionLocal() as db:
-        if not db.query(User).filter_by(username="admin").first():
-            db.add(User(username="admin", password_hash=hash_password("change-me")))
-            db.commit()
+def ensure_created_at_defaults():
+    # Postgres installs that predate the server-side created_at defaults can
+    # have the default attached in place; SQLite cannot alter a column default,
+    # but fresh SQLite schemas get it from create_all.
+    if engine.dialect.name != "postgresql":
+        return
+    with engine.begin() as conn:
+        for table in ("journal_entries", "crm_users", "leads", "lead_notes", "lead_tasks"):
+            conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN created_at SET DEFAULT now()"))
+
+
+def ensure_journal_line_amount_column():
+    # create_all covers fresh databases; existing installs gain the generated
+    # column here. SQLite can only ALTER-add VIRTUAL generated columns, while
+    # Postgres only supports STORED ones.
+    inspector = inspect(engine)
+    line_columns = {col["name"] for col in inspector.get_columns("journal_lines")}
+    if "amount" in line_columns:
+        return
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            conn.execute(text(
+                "ALTER TABLE journal_lines ADD COLUMN amount NUMERIC(14, 2) GENERATED ALWAYS AS (debit - credit) STORED"
+            ))
+        else:
+            conn.execute(text(
+                "ALTER TABLE journal_lines ADD COLUMN amount NUMERIC(14, 2) GENERATED ALWAYS AS (debit - credit) VIRTUAL"
+            ))
+
+
+def ensure_journal_indexes():
+    # create_all covers fresh databases; existing installs pick the new
+    # reporting indexes up here.
+    with engine.begin() as conn:
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_jl_account_entry ON journal_lines (account_id, entry_id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_jl_entry ON journal_lines (entry_id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_je_date_id ON journal_entries (date, id)"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_jl_party ON journal_lines (party_type, party_id) WHERE party_id IS NOT NULL"
+        ))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_accounts_type ON accounts (type)"))
+
+
+def ensure_recent_entries_index():
+    # Year-stamped partial index over the current year's entries: the hot
+    # report ranges (dashboard month, year-to-date statements) scan a small
+    # index regardless of how much history accumulates. The name carries the
+    # year so the predicate rolls forward each January; last year's index is
+    # dropped once its replacement exists.
+    year = date.today().year
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE INDEX IF NOT EXISTS ix_je_date_recent_{year} "
+            f"ON journal_entries (date) WHERE date >= '{year}-01-01'"
+        ))
+        conn.execute(text(f"DROP INDEX IF EXISTS ix_je_date_recent_{year - 1}"))
 
 
 def ensure_item_sku_column():
@@ -159,7 +389,7 @@ def login_post(
     next: str = Form("/dashboard"),
     db: Session = Depends(get_db),
 ):
-    user = db.query(User).filter(User.username == username).first()
+    user = db.execute(select(User).where(User.username == username)).scalars().first()
     if user and verify_password(password, user.password_hash):
         request.session["uid"] = user.id
         request.session["user"] = {"username": user.username}
@@ -170,6 +400,7 @@ def login_post(
 
 @app.get("/logout")
 def logout(request: Request):
+    invalidate_user_cache(request.session.get("uid"))
     request.session.clear()
     return RedirectResponse(LOGIN_PATH, status_code=303)
 
@@ -185,26 +416,34 @@ def dashboard(request: Request, db: Session = Depends(get_db), user: User = Depe
     today = date.today()
     start_month = today.replace(day=1)
 
-    revenue = (
-        db.query(func.coalesce(func.sum(JournalLine.credit), 0))
-        .join(Account).filter(Account.type == "INCOME")
-        .join(JournalEntry).filter(JournalEntry.date >= start_month, JournalEntry.date <= today)
-        .scalar() or 0
-    )
-    expenses = (
-        db.query(func.coalesce(func.sum(JournalLine.debit), 0))
-        .join(Account).filter(Account.type == "EXPENSE")
-        .join(JournalEntry).filter(JournalEntry.date >= start_month, JournalEntry.date <= today)
-        .scalar() or 0
-    )
+    cash_ids = app.state.cash_account_ids
+
+    def compute():
+        in_month = and_(JournalEntry.date >= start_month, JournalEntry.date <= today)
+        # Conditional aggregation: revenue, expenses and cash balance in one SELECT
+        # instead of two queries per KPI plus two per cash account.
+        return db.execute(
+            select(
+                func.coalesce(func.sum(case((and_(Account.type == "INCOME", in_month), JournalLine.credit), else_=0)), 0),
+                func.coalesce(func.sum(case((and_(Account.type == "EXPENSE", in_month), JournalLine.debit), else_=0)), 0),
+                func.coalesce(
+                    func.sum(
+                        case(
+                            (JournalLine.account_id.in_(cash_ids), JournalLine.amount),
+                            else_=0,
+                        )
+                    ),
+                    0,
+                ),
+            )
+            .select_from(JournalLine)
+            .join(Account)
+            .join(JournalEntry)
+        ).one()
+
+    revenue, expenses, cash_balance = cached_aggregate(("dashboard", start_month, today), compute)
     profit = float(revenue) - float(expenses)
-
-    cash_acc = db.query(Account).filter(Account.name.in_(["Cash on Hand", "Bank - Current Account"])).all()
-    cash_balance = 0.0
-    for acc in cash_acc:
-        dr = db.query(func.coalesce(func.sum(JournalLine.debit), 0)).filter(JournalLine.account_id == acc.id).scalar() or 0
-        cr = db.query(func.coalesce(func.sum(JournalLine.credit), 0)).filter(JournalLine.account_id == acc.id).scalar() or 0
-        cash_balance += float(dr) - float(cr)
+    cash_balance = float(cash_balance)
 
     return templates.TemplateResponse("dashboard.html", {
         "request": request, "currency": settings.CURRENCY,
@@ -214,7 +453,7 @@ def dashboard(request: Request, db: Session = Depends(get_db), user: User = Depe
 
 @app.get("/accounts", response_class=HTMLResponse)
 def list_accounts(request: Request, db: Session = Depends(get_db), user: User = Depends(require_user)):
-    accounts = db.query(Account).order_by(Account.code).all()
+    accounts = db.execute(select(Account).order_by(Account.code)).scalars().all()
     return templates.TemplateResponse("accounts.html", {"request": request, "accounts": accounts})
 
 @app.post("/accounts")
@@ -224,7 +463,8 @@ def create_account(
     type: str = Form(...),
     subtype: str = Form(""),
     description: str = Form(""),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    user: User = Depends(require_user),
 ):
     acc = Account(
         code=code.strip(),
@@ -235,12 +475,17 @@ def create_account(
     )
     db.add(acc)
     db.commit()
+    if acc.name in CASH_ACCOUNT_NAMES:
+        refresh_cash_account_ids()
+    # Reports render a row per account, so new accounts must invalidate the
+    # cached aggregates and ETags just like journal mutations do.
+    bump_journal_version()
     return RedirectResponse("/accounts", status_code=303)
 
 # ---------------------- Customers ----------------------
 @app.get("/customers", response_class=HTMLResponse)
 def list_customers(request: Request, db: Session = Depends(get_db), user: User = Depends(require_user)):
-    customers = db.query(Customer).order_by(Customer.name).all()
+    customers = db.execute(select(Customer).order_by(Customer.name)).scalars().all()
     return templates.TemplateResponse("customers.html", {"request": request, "customers": customers})
 
 @app.post("/customers")
@@ -262,7 +507,7 @@ def delete_customer(cust_id: int, db: Session = Depends(get_db), user: User = De
 # ---------------------- Suppliers ----------------------
 @app.get("/suppliers", response_class=HTMLResponse)
 def list_suppliers(request: Request, db: Session = Depends(get_db), user: User = Depends(require_user)):
-    suppliers = db.query(Supplier).order_by(Supplier.name).all()
+    suppliers = db.execute(select(Supplier).order_by(Supplier.name)).scalars().all()
     return templates.TemplateResponse("suppliers.html", {"request": request, "suppliers": suppliers})
 
 @app.post("/suppliers")
@@ -284,7 +529,7 @@ def delete_supplier(sup_id: int, db: Session = Depends(get_db), user: User = Dep
 # ---------------------- Items ----------------------
 @app.get("/items", response_class=HTMLResponse)
 def list_items(request: Request, db: Session = Depends(get_db), user: User = Depends(require_user)):
-    items = db.query(Item).order_by(Item.sku, Item.name).all()
+    items = db.execute(select(Item).order_by(Item.sku, Item.name)).scalars().all()
     return templates.TemplateResponse("items.html", {"request": request, "items": items})
 
 @app.post("/items")
@@ -314,20 +559,21 @@ def delete_item(item_id: int, db: Session = Depends(get_db), user: User = Depend
 @app.get("/crm", response_class=HTMLResponse)
 def crm_dashboard(request: Request, db: Session = Depends(get_db), user: User = Depends(require_user)):
     today = date.today()
-    total_leads = db.query(func.count(Lead.id)).scalar() or 0
-    new_leads = db.query(func.count(Lead.id)).filter(Lead.status == "NEW").scalar() or 0
-    followups_today = db.query(func.count(Lead.id)).filter(Lead.next_followup == today).scalar() or 0
-    completed_sales = db.query(func.count(Lead.id)).filter(Lead.status == "DELIVERED").scalar() or 0
-    lost_leads = db.query(func.count(Lead.id)).filter(Lead.status == "LOST").scalar() or 0
-
-    pending_followups = (
-        db.query(Lead)
-        .filter(Lead.next_followup.is_not(None), Lead.next_followup <= today, Lead.status.notin_(["DELIVERED", "LOST"]))
+    total_leads = db.execute(select(func.count(Lead.id))).scalar() or 0
+    new_leads = db.execute(select(func.count(Lead.id)).where(Lead.status == "NEW")).scalar() or 0
+    followups_today = db.execute(select(func.count(Lead.id)).where(Lead.next_followup == today)).scalar() or 0
+    completed_sales = db.execute(select(func.count(Lead.id)).where(Lead.status == "DELIVERED")).scalar() or 0
+    lost_leads = db.execute(select(func.count(Lead.id)).where(Lead.status == "LOST")).scalar() or 0
+
+    pending_followups = db.execute(
+        select(Lead)
+        .where(Lead.next_followup.is_not(None), Lead.next_followup <= today, Lead.status.notin_(["DELIVERED", "LOST"]))
         .order_by(Lead.next_followup.asc(), Lead.created_at.desc())
-        .all()
-    )
+    ).scalars().all()
 
-    recent_leads = db.query(Lead).order_by(Lead.created_at.desc(), Lead.id.desc()).limit(10).all()
+    recent_leads = db.execute(
+        select(Lead).order_by(Lead.created_at.desc(), Lead.id.desc()).limit(10)
+    ).scalars().all()
 
     return templates.TemplateResponse("crm_dashboard.html", {
         "request": request,
@@ -343,13 +589,13 @@ def crm_dashboard(request: Request, db: Session = Depends(get_db), user: User =
 
 @app.get("/crm/leads", response_class=HTMLResponse)
 def crm_leads(request: Request, q: str = "", db: Session = Depends(get_db), user: User = Depends(require_user)):
-    query = db.query(Lead)
+    stmt = select(Lead)
     q = q.strip()
     if q:
         like = f"%{q}%"
-        query = query.filter(or_(Lead.customer_name.ilike(like), Lead.mobile.ilike(like), Lead.city.ilike(like)))
-    leads = query.order_by(Lead.created_at.desc(), Lead.id.desc()).all()
-    crm_users = db.query(CRMUser).order_by(CRMUser.name).all()
+        stmt = stmt.where(or_(Lead.customer_name.ilike(like), Lead.mobile.ilike(like), Lead.city.ilike(like)))
+    leads = db.execute(stmt.order_by(Lead.created_at.desc(), Lead.id.desc())).scalars().all()
+    crm_users = db.execute(select(CRMUser).order_by(CRMUser.name)).scalars().all()
     return templates.TemplateResponse("crm_leads.html", {"request": request, "leads": leads, "statuses": LEAD_STATUSES, "q": q, "crm_users": crm_users})
 
 
@@ -371,7 +617,9 @@ def crm_create_lead(
     new_assignee_name = new_assignee.strip()
 
     if new_assignee_name:
-        existing_user = db.query(CRMUser).filter(func.lower(CRMUser.name) == new_assignee_name.lower()).first()
+        existing_user = db.execute(
+            select(CRMUser).where(func.lower(CRMUser.name) == new_assignee_name.lower())
+        ).scalars().first()
         if not existing_user:
             db.add(CRMUser(name=new_assignee_name))
         selected_assigned_to = new_assignee_name
@@ -387,7 +635,7 @@ def crm_create_lead(
         status=status if status in LEAD_STATUSES else "NEW",
         assigned_to=selected_assigned_to,
         notes=notes.strip(),
-        next_followup=datetime.strptime(next_followup, "%Y-%m-%d").date() if next_followup else None,
+        next_followup=date.fromisoformat(next_followup) if next_followup else None,
     )
     db.add(lead)
     db.commit()
@@ -400,8 +648,12 @@ def crm_lead_view(lead_id: int, request: Request, db: Session = Depends(get_db),
     if not lead:
         raise HTTPException(status_code=404, detail="Lead not found")
 
-    notes = db.query(LeadNote).filter(LeadNote.lead_id == lead_id).order_by(LeadNote.created_at.desc()).all()
-    tasks = db.query(LeadTask).filter(LeadTask.lead_id == lead_id).order_by(LeadTask.task_date.desc(), LeadTask.id.desc()).all()
+    notes = db.execute(
+        select(LeadNote).where(LeadNote.lead_id == lead_id).order_by(LeadNote.created_at.desc())
+    ).scalars().all()
+    tasks = db.execute(
+        select(LeadTask).where(LeadTask.lead_id == lead_id).order_by(LeadTask.task_date.desc(), LeadTask.id.desc())
+    ).scalars().all()
 
     return templates.TemplateResponse("crm_lead_view.html", {
         "request": request, "lead": lead, "notes": notes, "tasks": tasks, "statuses": LEAD_STATUSES
@@ -431,7 +683,7 @@ def crm_add_followup(
     if not lead:
         raise HTTPException(status_code=404, detail="Lead not found")
 
-    parsed_date = datetime.strptime(task_date, "%Y-%m-%d").date()
+    parsed_date = date.fromisoformat(task_date)
     task = LeadTask(lead_id=lead_id, task_date=parsed_date, status=status.strip().upper(), note=note.strip())
     lead.next_followup = parsed_date
     if status in LEAD_STATUSES:
@@ -444,11 +696,37 @@ def crm_add_followup(
 # ---------------------- Entries ----------------------
 @app.get("/entries", response_class=HTMLResponse)
 def list_entries(request: Request, db: Session = Depends(get_db), user: User = Depends(require_user)):
-    entries = db.query(JournalEntry).order_by(JournalEntry.date.desc(), JournalEntry.id.desc()).limit(200).all()
-    accounts = db.query(Account).order_by(Account.code).all()
-    customers = db.query(Customer).order_by(Customer.name).all()
-    suppliers = db.query(Supplier).order_by(Supplier.name).all()
-    items = db.query(Item).order_by(Item.name).all()
+    # The template walks entry.lines[*].account, so preload both relationships
+    # up front instead of lazy-loading them per rendered row.
+    entries = db.execute(
+        select(JournalEntry)
+        .options(selectinload(JournalEntry.lines).selectinload(JournalLine.account))
+        .order_by(JournalEntry.date.desc(), JournalEntry.id.desc())
+        .limit(200)
+    ).scalars().all()
+
+    # Resolve party references with one IN-list query per party type instead
+    # of a lookup per rendered line.
+    party_models = {PartyType.CUSTOMER: Customer, PartyType.SUPPLIER: Supplier, PartyType.ITEM: Item}
+    wanted = {ptype: set() for ptype in party_models}
+    for e in entries:
+        for l in e.lines:
+            if l.party_type and l.party_id:
+                wanted[l.party_type].add(l.party_id)
+    party_map = {}
+    for ptype, ids in wanted.items():
+        if ids:
+            model = party_models[ptype]
+            for obj in db.execute(select(model).where(model.id.in_(ids))).scalars().all():
+                party_map[(ptype, obj.id)] = obj
+    for e in entries:
+        for l in e.lines:
+            l.party = party_map.get((l.party_type, l.party_id))
+
+    accounts = db.execute(select(Account).order_by(Account.code)).scalars().all()
+    customers = db.execute(select(Customer).order_by(Customer.name)).scalars().all()
+    suppliers = db.execute(select(Supplier).order_by(Supplier.name)).scalars().all()
+    items = db.execute(select(Item).order_by(Item.name)).scalars().all()
     return templates.TemplateResponse(
         "entries.html",
         {
@@ -476,36 +754,46 @@ def create_entry(
     db: Session = Depends(get_db),
     user: User = Depends(require_user),
 ):
-    dt = datetime.strptime(date_str, "%Y-%m-%d").date()
-    entry = JournalEntry(date=dt, memo=memo)
-    db.add(entry)
-    db.flush()
+    # zip() would silently drop trailing fields from a malformed form; check
+    # the parallel lists line up once instead.
+    if not (len(accounts) == len(descriptions) == len(debits) == len(credits) == len(party_types) == len(party_ids) == len(qtys)):
+        return RedirectResponse("/entries?error=Malformed%20lines", status_code=303)
 
-    total_debit = 0.0
-    total_credit = 0.0
-    for a, d, dr, cr, pt, pid, q in zip(accounts, descriptions, debits, credits, party_types, party_ids, qtys):
-        dr_amt = float(dr or 0)
-        cr_amt = float(cr or 0)
-        total_debit += dr_amt
-        total_credit += cr_amt
-
-        line = JournalLine(
-            entry_id=entry.id,
-            account_id=int(a),
-            description=d.strip() if d else "",
-            debit=dr_amt,
-            credit=cr_amt,
-            party_type=pt or None,
-            party_id=int(pid) if pid else None,
-            qty=float(q or 0)
-        )
-        db.add(line)
+    dt = date.fromisoformat(date_str)
 
+    # One pass over the parallel form lists: build the insert rows in a single
+    # comprehension and derive the totals from them.
+    rows = [
+        {
+            "account_id": int(a),
+            "description": d.strip() if d else "",
+            "debit": float(dr or 0),
+            "credit": float(cr or 0),
+            "party_type": pt or None,
+            "party_id": int(pid) if pid else None,
+            "qty": float(q or 0),
+        }
+        for a, d, dr, cr, pt, pid, q in zip(accounts, descriptions, debits, credits, party_types, party_ids, qtys)
+    ]
+    total_debit = math.fsum(r["debit"] for r in rows)
+    total_credit = math.fsum(r["credit"] for r in rows)
+
+    # Reject unbalanced submissions before writing anything, so a bad POST
+    # costs zero INSERTs and no rollback.
     if round(total_debit, 2) != round(total_credit, 2):
-        db.rollback()
         return RedirectResponse("/entries?error=Not%20balanced", status_code=303)
 
+    entry = JournalEntry(date=dt, memo=memo)
+    db.add(entry)
+    db.flush()
+    for r in rows:
+        r["entry_id"] = entry.id
+
+    # One executemany INSERT for all lines instead of one statement per line.
+    db.execute(insert(JournalLine), rows)
+    apply_balance_deltas(db, dt, ((r["account_id"], r["debit"], r["credit"]) for r in rows))
     db.commit()
+    bump_journal_version()
     return RedirectResponse("/entries", status_code=303)
 
 @app.post("/entries/{entry_id}/delete")
@@ -514,8 +802,10 @@ def delete_entry(entry_id: int, db: Session = Depends(get_db), user: User = Depe
     entry = db.get(JournalEntry, entry_id)
     if not entry:
         raise HTTPException(status_code=404, detail="Entry not found")
+    apply_balance_deltas(db, entry.date, ((l.account_id, l.debit, l.credit) for l in entry.lines), sign=-1)
     db.delete(entry)
     db.commit()
+    bump_journal_version()
     return RedirectResponse(url="/entries", status_code=status.HTTP_303_SEE_OTHER)
 
 # ---------------------- Reports ----------------------
@@ -528,44 +818,47 @@ def trial_balance(
     db: Session = Depends(get_db),
     user: User = Depends(require_user),
 ):
-    from datetime import datetime as dt
-    start_dt = dt.strptime(start, "%Y-%m-%d").date() if start else None
-    end_dt = dt.strptime(end, "%Y-%m-%d").date() if end else None
-
-    accounts = db.query(Account).order_by(Account.code).all()
-    rows = []
-    total_debit = 0.0
-    total_credit = 0.0
-
-    for acc in accounts:
-        dr = db.query(func.coalesce(func.sum(JournalLine.debit), 0)).join(JournalEntry).filter(JournalLine.account_id == acc.id)
-        cr = db.query(func.coalesce(func.sum(JournalLine.credit), 0)).join(JournalEntry).filter(JournalLine.account_id == acc.id)
-        if start_dt:
-            dr = dr.filter(JournalEntry.date >= start_dt)
-            cr = cr.filter(JournalEntry.date >= start_dt)
-        if end_dt:
-            dr = dr.filter(JournalEntry.date <= end_dt)
-            cr = cr.filter(JournalEntry.date <= end_dt)
-        dr_amt = float(dr.scalar() or 0)
-        cr_amt = float(cr.scalar() or 0)
-        bal = dr_amt - cr_amt
-        debit = bal if bal > 0 else 0.0
-        credit = -bal if bal < 0 else 0.0
-        total_debit += debit
-        total_credit += credit
-        rows.append({"code": acc.code, "name": acc.name, "debit": debit, "credit": credit})
-
-    return templates.TemplateResponse(
-        "trial_balance.html",
-        {
-            "request": request,
-            "rows": rows,
-            "total_debit": total_debit,
-            "total_credit": total_credit,
-            "currency": settings.CURRENCY,
-            "start": start,
-            "end": end,
-        },
+    etag = report_etag("tb", start, end)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304)
+
+    start_dt = date.fromisoformat(start) if start else None
+    end_dt = date.fromisoformat(end) if end else None
+
+    # One statement: a net-movement CTE joined back onto accounts, instead of
+    # a separate accounts query merged with a sums dict in Python.
+    tb = trial_balance_rows(db, start=start_dt, end=end_dt)
+
+    total_debit = sum(float(net) for _, _, net in tb if net > 0)
+    total_credit = sum(-float(net) for _, _, net in tb if net < 0)
+
+    def iter_rows():
+        for code, name, net in tb:
+            bal = float(net)
+            yield {
+                "code": code,
+                "name": name,
+                "debit": bal if bal > 0 else 0.0,
+                "credit": -bal if bal < 0 else 0.0,
+            }
+
+    # Stream the render: rows are generated as the template consumes them
+    # instead of materializing the full report in memory first.
+    template = templates.get_template("trial_balance.html")
+    return StreamingResponse(
+        template.stream(
+            {
+                "request": request,
+                "rows": iter_rows(),
+                "total_debit": total_debit,
+                "total_credit": total_credit,
+                "currency": settings.CURRENCY,
+                "start": start,
+                "end": end,
+            }
+        ),
+        media_type="text/html",
+        headers={"ETag": etag, "Cache-Control": "private, no-cache"},
     )
 
 @app.get("/reports/income-statement", response_class=HTMLResponse)
@@ -576,7 +869,6 @@ def income_statement(
     db: Session = Depends(get_db),
     user: User = Depends(require_user),
 ):
-    from datetime import datetime as dt
     if not start or not end:
         return templates.TemplateResponse(
             "income_statement.html",
@@ -593,30 +885,33 @@ def income_statement(
             },
         )
 
-    start_dt = dt.strptime(start, "%Y-%m-%d").date()
-    end_dt = dt.strptime(end, "%Y-%m-%d").date()
-
-    income = (
-        db.query(func.coalesce(func.sum(JournalLine.credit), 0))
-        .join(Account).filter(Account.type == "INCOME")
-        .join(JournalEntry)
-        .filter(JournalEntry.date >= start_dt, JournalEntry.date <= end_dt)
-        .scalar() or 0
-    )
-    cogs = (
-        db.query(func.coalesce(func.sum(JournalLine.debit), 0))
-        .join(Account).filter(Account.code == "5000")
-        .join(JournalEntry)
-        .filter(JournalEntry.date >= start_dt, JournalEntry.date <= end_dt)
-        .scalar() or 0
-    )
-    other_exp = (
-        db.query(func.coalesce(func.sum(JournalLine.debit), 0))
-        .join(Account).filter(Account.type == "EXPENSE", Account.code != "5000")
-        .join(JournalEntry)
-        .filter(JournalEntry.date >= start_dt, JournalEntry.date <= end_dt)
-        .scalar() or 0
-    )
+    start_dt = date.fromisoformat(start)
+    end_dt = date.fromisoformat(end)
+
+    def compute():
+        # Income, COGS and other expenses in one scan of the date range via
+        # conditional sums, instead of three near-identical aggregate queries.
+        return db.execute(
+            select(
+                func.coalesce(func.sum(case((Account.type == "INCOME", JournalLine.credit), else_=0)), 0),
+                func.coalesce(func.sum(case((Account.code == "5000", JournalLine.debit), else_=0)), 0),
+                func.coalesce(
+                    func.sum(
+                        case(
+                            (and_(Account.type == "EXPENSE", Account.code != "5000"), JournalLine.debit),
+                            else_=0,
+                        )
+                    ),
+                    0,
+                ),
+            )
+            .select_from(JournalLine)
+            .join(Account)
+            .join(JournalEntry)
+            .where(JournalEntry.date >= start_dt, JournalEntry.date <= end_dt)
+        ).one()
+
+    income, cogs, other_exp = cached_aggregate(("income_statement", start_dt, end_dt), compute)
 
     gross_profit = float(income) - float(cogs)
     net_profit = gross_profit - float(other_exp)
@@ -640,8 +935,6 @@ def income_statement(
 # ---------------------- Balance Sheet ----------------------
 @app.get("/reports/balance-sheet", response_class=HTMLResponse)
 def balance_sheet(request: Request, as_of: str | None = None, db: Session = Depends(get_db), user: User = Depends(require_user)):
-    from datetime import datetime as dt
-
     if not as_of:
         return templates.TemplateResponse("balance_sheet.html", {
             "request": request, "currency": settings.CURRENCY, "as_of": None,
@@ -652,46 +945,58 @@ def balance_sheet(request: Request, as_of: str | None = None, db: Session = Depe
             "equity_total": 0, "liab_equity_total": 0
         })
 
-    as_of_dt = dt.strptime(as_of, "%Y-%m-%d").date()
-
-    def account_balance(acc: Account):
-        dr = db.query(func.coalesce(func.sum(JournalLine.debit), 0))\
-            .filter(JournalLine.account_id == acc.id).join(JournalEntry).filter(JournalEntry.date <= as_of_dt).scalar() or 0
-        cr = db.query(func.coalesce(func.sum(JournalLine.credit), 0))\
-            .filter(JournalLine.account_id == acc.id).join(JournalEntry).filter(JournalEntry.date <= as_of_dt).scalar() or 0
-        if acc.type in {"ASSET", "EXPENSE"}:
-            return float(dr) - float(cr)
-        return float(cr) - float(dr)
-
-    accounts = db.query(Account).all()
+    etag = report_etag("bs", as_of)
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304)
+
+    as_of_dt = date.fromisoformat(as_of)
+
+    # One grouped statement over the per-day rollup returns a compact
+    # (type, subtype, name, signed balance) row per active account — no ORM
+    # entities and no per-account balance closure.
+    rows_q = db.execute(
+        select(
+            Account.type,
+            Account.subtype,
+            Account.name,
+            (
+                func.coalesce(func.sum(AccountBalanceDaily.debit_sum), 0)
+                - func.coalesce(func.sum(AccountBalanceDaily.credit_sum), 0)
+            ).label("signed"),
+        )
+        .join(AccountBalanceDaily, AccountBalanceDaily.account_id == Account.id)
+        .where(AccountBalanceDaily.date <= as_of_dt)
+        .group_by(Account.id, Account.type, Account.subtype, Account.name)
+    ).all()
 
     assets_current, assets_non_current = [], []
     liab_current, liab_non_current = [], []
     equity_capital = []
     retained_earnings = 0
 
-    for acc in accounts:
-        bal = account_balance(acc)
+    for acc_type, acc_subtype, acc_name, signed in rows_q:
+        signed = float(signed)
+        bal = signed if acc_type in {"ASSET", "EXPENSE"} else -signed
         if abs(bal) < 0.01:
             continue
-        if acc.type == "ASSET":
-            if acc.subtype == "CURRENT_ASSET":
-                assets_current.append((acc.name, bal))
-            elif acc.subtype == "NON_CURRENT_ASSET":
-                assets_non_current.append((acc.name, bal))
-        elif acc.type == "LIABILITY":
-            if acc.subtype == "CURRENT_LIABILITY":
-                liab_current.append((acc.name, bal))
-            elif acc.subtype == "NON_CURRENT_LIABILITY":
-                liab_non_current.append((acc.name, bal))
-        elif acc.type == "EQUITY":
-            if acc.subtype == "CAPITAL":
-                equity_capital.append((acc.name, bal))
-            elif acc.subtype == "RETAINED_EARNINGS":
+        if acc_type == "ASSET":
+            if acc_subtype == "CURRENT_ASSET":
+                assets_current.append((acc_name, bal))
+            elif acc_subtype == "NON_CURRENT_ASSET":
+                assets_non_current.append((acc_name, bal))
+        elif acc_type == "LIABILITY":
+            if acc_subtype == "CURRENT_LIABILITY":
+                liab_current.append((acc_name, bal))
+            elif acc_subtype == "NON_CURRENT_LIABILITY":
+                liab_non_current.append((acc_name, bal))
+        elif acc_type == "EQUITY":
+            if acc_subtype == "CAPITAL":
+                equity_capital.append((acc_name, bal))
+            elif acc_subtype == "RETAINED_EARNINGS":
                 retained_earnings += bal
-        elif acc.type == "INCOME":
+        elif acc_type == "INCOME":
             retained_earnings += bal
-        elif acc.type == "EXPENSE":
+        elif acc_type == "EXPENSE":
             retained_earnings -= bal
 
     assets_total = sum(b for _, b in assets_current + assets_non_current)
@@ -708,4 +1013,4 @@ def balance_sheet(request: Request, as_of: str | None = None, db: Session = Depe
         "equity_capital": equity_capital, "retained_earnings": retained_earnings,
         "assets_total": assets_total, "liab_total": liab_total,
         "equity_total": equity_total, "liab_equity_total": liab_equity_total
-    })
+    }, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Numeric, Text, Float, Enum
+from sqlalchemy import Column, Computed, Integer, String, Date, DateTime, ForeignKey, Index, Numeric, Text, Float, Enum, func, text
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from datetime import datetime
 from database import Base
@@ -18,63 +18,103 @@ class PartyType(str, enum.Enum):
 class Account(Base):
     __tablename__ = "accounts"
     id = Column(Integer, primary_key=True, index=True)
-    code = Column(String, unique=True, nullable=False)
-    name = Column(String, nullable=False)
-    type = Column(String, nullable=False)  # ASSET, LIABILITY, EQUITY, INCOME, EXPENSE
-    subtype = Column(String, nullable=True)  # Current Asset, Non-Current Asset, etc.
-    description = Column(String, nullable=True)
+    code = Column(String(16), unique=True, nullable=False)
+    name = Column(String(120), nullable=False)
+    type = Column(String(16), nullable=False, index=True)  # ASSET, LIABILITY, EQUITY, INCOME, EXPENSE
+    subtype = Column(String(64), nullable=True)  # Current Asset, Non-Current Asset, etc.
+    description = Column(String(255), nullable=True)
 
     lines = relationship("JournalLine", back_populates="account", cascade="all, delete-orphan")
 
 class JournalEntry(Base):
     __tablename__ = "journal_entries"
+    # Compound index serving the entries listing's ORDER BY date DESC, id DESC.
+    __table_args__ = (Index("ix_je_date_id", "date", "id"),)
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     date: Mapped[datetime] = mapped_column(Date, index=True)
     memo: Mapped[str] = mapped_column(String(255), default="")
-    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
+    # server_default stamps rows from raw SQL and fresh schemas; the client
+    # default stays so databases migrated from before the DDL default (SQLite
+    # cannot ALTER one in) keep satisfying NOT NULL on ORM inserts.
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, server_default=func.now())
 
     lines = relationship("JournalLine", back_populates="entry", cascade="all, delete-orphan")
 
 class JournalLine(Base):
     __tablename__ = "journal_lines"
+    # Covering indexes for the report aggregations, which always filter/group
+    # on account_id and join journal_entries on entry_id.
+    __table_args__ = (
+        Index("ix_jl_account_entry", "account_id", "entry_id"),
+        Index("ix_jl_entry", "entry_id"),
+        # Partial index for sub-ledger lookups (customer statements, supplier
+        # ageing, item ledgers); most GL lines carry no party, so it stays small.
+        Index(
+            "ix_jl_party",
+            "party_type",
+            "party_id",
+            sqlite_where=text("party_id IS NOT NULL"),
+            postgresql_where=text("party_id IS NOT NULL"),
+        ),
+    )
     id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
     entry_id: Mapped[int] = mapped_column(ForeignKey("journal_entries.id", ondelete="CASCADE"))
     account_id: Mapped[int] = mapped_column(ForeignKey("accounts.id", ondelete="RESTRICT"))
     description: Mapped[str] = mapped_column(String(255), default="")
-    debit: Mapped[float] = mapped_column(Numeric(14, 2), default=0)
-    credit: Mapped[float] = mapped_column(Numeric(14, 2), default=0)
+    # asdecimal=False returns plain floats from the driver, skipping a
+    # decimal.Decimal construction per fetched value on the report paths.
+    debit: Mapped[float] = mapped_column(Numeric(14, 2, asdecimal=False), default=0)
+    credit: Mapped[float] = mapped_column(Numeric(14, 2, asdecimal=False), default=0)
+    # Signed amount (+debit / -credit) generated by the database, so report
+    # aggregations sum one column instead of two plus a subtraction.
+    amount: Mapped[float] = mapped_column(Numeric(14, 2, asdecimal=False), Computed("debit - credit", persisted=True))
 
     # 🔹 New fields for Hybrid Sub-ledgers
-    party_type = Column(Enum(PartyType), nullable=True)   # CUSTOMER / SUPPLIER / ITEM
+    # Named native enum: Postgres stores a 4-byte enum value instead of a
+    # VARCHAR plus CHECK constraint; SQLite keeps the VARCHAR fallback.
+    party_type = Column(Enum(PartyType, name="party_type", native_enum=True), nullable=True)
     party_id = Column(Integer, nullable=True)             # Refers to Customer.id / Supplier.id / Item.id
     qty = Column(Float, default=0.0)                      # For inventory qty tracking
 
     entry = relationship("JournalEntry", back_populates="lines")
     account = relationship("Account", back_populates="lines")
 
+class AccountBalanceDaily(Base):
+    """Per-account, per-day debit/credit rollup maintained incrementally on
+    entry create/delete so reports aggregate days instead of raw lines."""
+    __tablename__ = "account_balance_daily"
+    __table_args__ = (
+        Index("ix_abd_account_date", "account_id", "date", unique=True),
+    )
+    id = Column(Integer, primary_key=True)
+    account_id = Column(Integer, ForeignKey("accounts.id", ondelete="CASCADE"), nullable=False)
+    date = Column(Date, nullable=False)
+    debit_sum = Column(Numeric(14, 2, asdecimal=False), default=0, nullable=False)
+    credit_sum = Column(Numeric(14, 2, asdecimal=False), default=0, nullable=False)
+
 # ----------------------
 # Master Data Tables
 # ----------------------
 class Customer(Base):
     __tablename__ = "customers"
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, nullable=False, unique=True)
-    email = Column(String, nullable=True)
-    phone = Column(String, nullable=True)
+    name = Column(String(120), nullable=False, unique=True)
+    email = Column(String(255), nullable=True)
+    phone = Column(String(32), nullable=True)
 
 class Supplier(Base):
     __tablename__ = "suppliers"
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, nullable=False, unique=True)
-    email = Column(String, nullable=True)
-    phone = Column(String, nullable=True)
+    name = Column(String(120), nullable=False, unique=True)
+    email = Column(String(255), nullable=True)
+    phone = Column(String(32), nullable=True)
 
 class Item(Base):
     __tablename__ = "items"
     id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, nullable=False, unique=True)
-    sku = Column(String, nullable=False, unique=True, index=True)
-    unit = Column(String, nullable=True)   # e.g., pcs, kg, box
+    name = Column(String(120), nullable=False, unique=True)
+    sku = Column(String(64), nullable=False, unique=True, index=True)
+    unit = Column(String(16), nullable=True)   # e.g., pcs, kg, box
 
 # ----------------------
 # Users
@@ -96,7 +136,7 @@ class CRMUser(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, nullable=False)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now())
 
 class Lead(Base):
     __tablename__ = "leads"
@@ -112,7 +152,7 @@ class Lead(Base):
     product_interest = Column(String)
     notes = Column(Text)
     next_followup = Column(Date)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now())
 
 
 class LeadNote(Base):
@@ -121,7 +161,7 @@ class LeadNote(Base):
     id = Column(Integer, primary_key=True)
     lead_id = Column(Integer, ForeignKey("leads.id"))
     note = Column(Text)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now())
 
 
 class LeadTask(Base):
@@ -132,4 +172,4 @@ class LeadTask(Base):
     task_date = Column(Date)
     status = Column(String, default="PENDING")
     note = Column(Text)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.now())
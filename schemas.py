@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import date
 from typing import List, Optional
 
@@ -15,8 +15,7 @@ class AccountOut(BaseModel):
     type: str
     description: str
 
-    class Config:
-        from_attributes = True
+    model_config = ConfigDict(from_attributes=True)
 
 class JournalLineIn(BaseModel):
     account_id: int
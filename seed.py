@@ -1,5 +1,6 @@
 from database import Base, engine, SessionLocal
 from models import Account
+from sqlalchemy import insert, select
 from sqlalchemy.orm import Session
 
 def seed_accounts(session: Session):
@@ -23,12 +24,20 @@ def seed_accounts(session: Session):
         ("5400", "Utilities Expense", "EXPENSE"),
         ("5500", "Bank Charges", "EXPENSE"),
     ]
-    for code, name, typ in accounts:
-        if not session.query(Account).filter_by(code=code).first():
-            session.add(Account(code=code, name=name, type=typ, description=""))
+    # One SELECT of the existing codes and one executemany INSERT, instead of
+    # a lookup round-trip (and a unit-of-work flush) per seed row.
+    existing = {code for (code,) in session.execute(select(Account.code)).all()}
+    missing = [
+        {"code": code, "name": name, "type": typ, "description": ""}
+        for code, name, typ in accounts
+        if code not in existing
+    ]
+    if missing:
+        session.execute(insert(Account), missing)
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
+def init_db(create_schema: bool = True):
+    if create_schema:
+        Base.metadata.create_all(bind=engine)
     session = SessionLocal()
     try:
         seed_accounts(session)
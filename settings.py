@@ -1,19 +1,32 @@
 import os
+from functools import lru_cache
+
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
 
+
 class Settings(BaseSettings):
     APP_NAME: str = "PixiePinks Ledger"
 
     # Read DATABASE_URL from environment (Railway sets this automatically)
     DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///./ledger.db")
 
-    # Fix for SQLAlchemy when Railway gives "postgres://"
-    if DATABASE_URL.startswith("postgres://"):
-        DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-
     CURRENCY: str = "LKR"
     SECRET_KEY: str = os.getenv("SECRET_KEY", "change-this-in-railway")
+    DEBUG: bool = False
+
+    @field_validator("DATABASE_URL")
+    @classmethod
+    def _fix_postgres_scheme(cls, v: str) -> str:
+        # SQLAlchemy rejects the legacy "postgres://" scheme Railway hands out.
+        if v.startswith("postgres://"):
+            return v.replace("postgres://", "postgresql://", 1)
+        return v
+
 
+@lru_cache
+def get_settings() -> Settings:
+    return Settings()
 
-settings = Settings()
 
+settings = get_settings()
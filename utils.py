@@ -4,45 +4,94 @@ from models import JournalLine, Account
 from typing import Dict
 
 # Normal balance: debit for ASSET/EXPENSE, credit for LIABILITY/EQUITY/INCOME
-DEBIT_NORMAL = {"ASSET", "EXPENSE"}
-CREDIT_NORMAL = {"LIABILITY", "EQUITY", "INCOME"}
+DEBIT_NORMAL = frozenset({"ASSET", "EXPENSE"})
+CREDIT_NORMAL = frozenset({"LIABILITY", "EQUITY", "INCOME"})
+
+# +1 for debit-normal types, -1 for credit-normal: lets balance presentation
+# be a single multiply instead of per-type branching.
+NORMAL_SIGN = {"ASSET": 1.0, "EXPENSE": 1.0, "LIABILITY": -1.0, "EQUITY": -1.0, "INCOME": -1.0}
 
 def account_balance(session: Session, account_id: int, start=None, end=None):
-    q = select(
-        func.coalesce(func.sum(JournalLine.debit), 0).label("debit"),
-        func.coalesce(func.sum(JournalLine.credit), 0).label("credit")
-    ).where(JournalLine.account_id == account_id)
+    # SUM over the generated signed amount column: one column scanned and no
+    # debit-minus-credit arithmetic per call.
+    q = select(func.coalesce(func.sum(JournalLine.amount), 0)).where(JournalLine.account_id == account_id)
+    if start or end:
+        from models import JournalEntry
+        q = q.join(JournalEntry, JournalLine.entry_id == JournalEntry.id)
     if start:
-        q = q.join(JournalLine.entry).where(JournalLine.entry.has(date__gte=start))
+        q = q.where(JournalEntry.date >= start)
     if end:
-        q = q.join(JournalLine.entry).where(JournalLine.entry.has(date__lte=end))
-    row = session.execute(q).one()
-    return float(row.debit or 0) - float(row.credit or 0)
+        q = q.where(JournalEntry.date <= end)
+    return float(session.execute(q).scalar() or 0)
 
-def account_balance_normal(session: Session, account: Account, start=None, end=None):
-    q = session.query(JournalLine).join(Account, JournalLine.account_id == Account.id)
+def account_balances_bulk(session: Session, account_ids, start=None, end=None) -> Dict[int, float]:
+    """Net balance for many accounts in one grouped aggregate, instead of one
+    account_balance() round-trip per account."""
+    q = (
+        select(JournalLine.account_id, func.coalesce(func.sum(JournalLine.amount), 0))
+        .where(JournalLine.account_id.in_(account_ids))
+        .group_by(JournalLine.account_id)
+    )
     if start or end:
         from models import JournalEntry
         q = q.join(JournalEntry, JournalLine.entry_id == JournalEntry.id)
     if start:
-        q = q.filter(JournalEntry.date >= start)
+        q = q.where(JournalEntry.date >= start)
+    if end:
+        q = q.where(JournalEntry.date <= end)
+    balances = {account_id: 0.0 for account_id in account_ids}
+    for account_id, net in session.execute(q):
+        balances[account_id] = float(net or 0)
+    return balances
+
+
+def trial_balance_rows(session: Session, start=None, end=None):
+    """Trial balance as one statement: a CTE of per-account net movement
+    LEFT JOINed back onto accounts, replacing the Python-side merge of a
+    separate accounts query and sums dict."""
+    from models import JournalEntry
+
+    nets = select(
+        JournalLine.account_id.label("account_id"),
+        func.sum(JournalLine.amount).label("net"),
+    )
+    if start or end:
+        nets = nets.join(JournalEntry, JournalLine.entry_id == JournalEntry.id)
+    if start:
+        nets = nets.where(JournalEntry.date >= start)
     if end:
-        q = q.filter(JournalEntry.date <= end)
+        nets = nets.where(JournalEntry.date <= end)
+    nets = nets.group_by(JournalLine.account_id).cte("account_nets")
+
+    q = (
+        select(Account.code, Account.name, func.coalesce(nets.c.net, 0).label("net"))
+        .outerjoin(nets, nets.c.account_id == Account.id)
+        .order_by(Account.code)
+    )
+    return session.execute(q).all()
 
-    debit = session.query(func.coalesce(func.sum(JournalLine.debit), 0)).filter(JournalLine.account_id == account.id)
-    credit = session.query(func.coalesce(func.sum(JournalLine.credit), 0)).filter(JournalLine.account_id == account.id)
 
+def account_balance_normal(session: Session, account: Account, start=None, end=None):
+    # One SELECT SUM(debit), SUM(credit) round-trip; the entry join is only
+    # added when a date filter needs it.
+    q = select(
+        func.coalesce(func.sum(JournalLine.debit), 0),
+        func.coalesce(func.sum(JournalLine.credit), 0),
+    ).where(JournalLine.account_id == account.id)
     if start or end:
-        # recompute with date filter
-        debit = q.filter(JournalLine.account_id == account.id).with_entities(func.coalesce(func.sum(JournalLine.debit), 0))
-        credit = q.filter(JournalLine.account_id == account.id).with_entities(func.coalesce(func.sum(JournalLine.credit), 0))
-
-    dr = float(debit.scalar() or 0)
-    cr = float(credit.scalar() or 0)
-    bal = dr - cr
-    if account.type in DEBIT_NORMAL:
-        return {"debit": max(bal, 0.0), "credit": max(-bal, 0.0), "normal_balance": bal}
-    else:
-        # credit-normal -> invert sign for presentation
-        bal = -bal
-        return {"debit": max(-bal, 0.0), "credit": max(bal, 0.0), "normal_balance": bal}
\ No newline at end of file
+        from models import JournalEntry
+        q = q.join(JournalEntry, JournalLine.entry_id == JournalEntry.id)
+    if start:
+        q = q.where(JournalEntry.date >= start)
+    if end:
+        q = q.where(JournalEntry.date <= end)
+
+    dr, cr = session.execute(q).one()
+    bal = float(dr or 0) - float(cr or 0)
+    return {
+        "debit": bal if bal > 0 else 0.0,
+        "credit": -bal if bal < 0 else 0.0,
+        # Unknown types fall back to credit-normal, matching the old
+        # "in DEBIT_NORMAL ... else" branching.
+        "normal_balance": bal * NORMAL_SIGN.get(account.type, -1.0),
+    }
\ No newline at end of file